@@ -1,6 +1,7 @@
 import os
 import logging
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
@@ -12,13 +13,43 @@ logging.basicConfig(level=logging.INFO)
 logging.getLogger('pdfminer').setLevel(logging.WARNING)
 logging.getLogger('pdfplumber').setLevel(logging.WARNING)
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
 
+class AppJSONProvider(DefaultJSONProvider):
+    """Default JSON provider that also serializes models, so views can jsonify them directly."""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, db.Model):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+class OrjsonProvider(AppJSONProvider):
+    """JSON provider backed by orjson, keeping Flask's handling of dates and other extra types."""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Create the app
 app = Flask(__name__)
+app.json = OrjsonProvider(app) if ORJSON_AVAILABLE else AppJSONProvider(app)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
@@ -1,4 +1,11 @@
+import atexit
 import logging
+import pickle
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Tuple
 from openai import OpenAI
 import os
@@ -7,97 +14,33 @@ from web_search import WebSearcher
 
 logger = logging.getLogger(__name__)
 
-class ChatService:
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        self.vector_store = VectorStore()
-        self.web_searcher = WebSearcher()
-        
-        # Load existing vector store if available
-        try:
-            self.vector_store.load("vector_store")
-        except:
-            pass  # Start with empty store if loading fails
-    
-    def process_pdf_chunks(self, text_chunks: List[str], document_id: int):
-        """Add PDF text chunks to the vector store."""
-        try:
-            self.vector_store.add_texts(text_chunks, document_id)
-            # Save the updated vector store
-            self.vector_store.save("vector_store")
-            logger.info(f"Processed {len(text_chunks)} chunks for document {document_id}")
-        except Exception as e:
-            logger.error(f"Error processing PDF chunks: {e}")
-            raise
-    
-    def generate_response(self, query: str, session_id: str, ai_role: str = "You are a helpful AI assistant.") -> Tuple[str, List[Dict]]:
-        """
-        Generate a response combining PDF content and web search results.
-        Returns the response text and a list of sources.
-        """
-        try:
-            sources = []
-            context_parts = []
-            
-            # Get active documents for current session only
-            from models import Document
-            active_docs = Document.query.filter_by(session_id=session_id, is_active=True).all()
-            active_doc_ids = {doc.id for doc in active_docs}
-            
-            # 1. Search PDF content (filtered by session)
-            pdf_results = self.vector_store.search(query, k=5)
-            
-            if pdf_results:
-                pdf_context = []
-                pdf_doc_ids = set()  # Track unique document IDs
-                for text, score, doc_id in pdf_results:
-                    # Only include results from current session's active documents
-                    if score > 0.1 and doc_id in active_doc_ids:
-                        pdf_context.append(text)
-                        pdf_doc_ids.add(doc_id)
-                
-                # Add only one source entry for PDF documents (deduplicated)
-                if pdf_context:
-                    context_parts.append(f"📘 **From PDF Documents:**\n{' '.join(pdf_context[:3])}")
-                    # Add a single PDF source entry
-                    sources.append({
-                        'type': 'pdf',
-                        'content': f"Retrieved from {len(pdf_doc_ids)} PDF document(s)",
-                        'document_count': len(pdf_doc_ids)
-                    })
-                    
-                    # Extract images if query suggests visual content is needed or content is found
-                    image_keywords = ['image', 'picture', 'chart', 'graph', 'diagram', 'figure', 'photo', 'show me', 'display', 'structure', 'formula', 'equation', 'reaction', 'process', 'cycle', 'model']
-                    should_extract_images = any(keyword in query.lower() for keyword in image_keywords)
-                    
-                    # Extract images when there are relevant text chunks or visual keywords
-                    if should_extract_images or len(pdf_results) > 0:
-                        logger.info(f"Attempting to extract images for query: {query}")
-                        self._extract_relevant_images(pdf_doc_ids, query, sources, pdf_results)
-            
-            # 2. Search web content
-            web_results = self.web_searcher.search_multiple_sources(query, max_results=2)
-            if web_results:
-                web_context = []
-                for result in web_results:
-                    web_context.append(f"{result['title']}: {result['snippet']}")
-                    sources.append({
-                        'type': 'web',
-                        'title': result['title'],
-                        'snippet': result['snippet'],
-                        'url': result['url'],
-                        'source': result['source']
-                    })
-                
-                if web_context:
-                    context_parts.append(f"🌐 **From Web Search:**\n{' '.join(web_context)}")
-            
-            # 3. Generate response using OpenAI
-            context = "\n\n".join(context_parts) if context_parts else "No specific context found."
-            
-            # Use role-based system prompt if provided
-            if ai_role:
-                system_prompt = f"""{ai_role}
+# Process-wide shared clients, created lazily on first use
+_singleton_lock = threading.Lock()
+_openai_client = None
+_vector_store = None
+_vector_store_mtime = None
+_web_searcher = None
+_pdf_processor = None
+
+VECTOR_STORE_PATH = "vector_store"
+
+# Ingest saves are debounced: flush at most every few seconds or after many new chunks,
+# and SAVE_DEBOUNCE_SECONDS after the last add at the latest. Guarded by _singleton_lock
+SAVE_DEBOUNCE_SECONDS = 5.0
+SAVE_MAX_PENDING_CHUNKS = 1000
+_pending_chunks = 0
+_last_vector_store_save = 0.0
+_flush_timer = None
+
+# Queries mentioning any of these hint that visual content is wanted (substring match, like `in`)
+_IMAGE_KEYWORDS_RE = re.compile(
+    r'image|picture|chart|graph|diagram|figure|photo|show me|display|structure'
+    r'|formula|equation|reaction|process|cycle|model',
+    re.IGNORECASE
+)
+
+# Prompt text is constant apart from the role, context and query, so build it once
+_ROLE_PROMPT_SUFFIX = """
 
 When answering questions:
 1. Stay true to your assigned role and personality throughout the response
@@ -106,8 +49,8 @@ When answering questions:
 4. If you're a teacher, explain with examples and ask clarifying questions
 5. If you're an expert, provide detailed technical insights
 6. Maintain your character while being helpful and informative"""
-            else:
-                system_prompt = """You are a helpful AI assistant that answers questions using information from PDF documents and web search results. 
+
+_DEFAULT_SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions using information from PDF documents and web search results. 
 
 Instructions:
 1. Use the provided context to answer the user's question
@@ -116,19 +59,155 @@ Instructions:
 4. Provide a comprehensive answer that synthesizes information from both sources when available
 5. Be concise but informative"""
 
-            user_prompt = f"""Context information:
+_USER_PROMPT_TEMPLATE = """Context information:
 {context}
 
 User question: {query}
 
 Please provide a helpful answer based on the available context. Use 📘 to indicate information from PDF documents and 🌐 to indicate information from web sources."""
 
+# Runs the CPU-bound vector search and the network-bound web search side by side
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="chat-search")
+
+def _get_openai_client() -> OpenAI:
+    """Return the shared OpenAI client, creating it on first use."""
+    global _openai_client
+    if _openai_client is None:
+        with _singleton_lock:
+            if _openai_client is None:
+                _openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return _openai_client
+
+def _vector_store_signature():
+    """Return the mtimes of the persisted index and metadata files (None if missing)."""
+    signature = []
+    for suffix in (".faiss", ".pkl"):
+        try:
+            signature.append(os.stat(VECTOR_STORE_PATH + suffix).st_mtime_ns)
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+def _get_vector_store() -> VectorStore:
+    """Return the shared vector store, reloading from disk only when the files changed."""
+    global _vector_store, _vector_store_mtime
+    signature = _vector_store_signature()
+    # Never reload over chunks that have not been flushed to disk yet
+    if _vector_store is not None and (signature == _vector_store_mtime or _pending_chunks):
+        return _vector_store
+    
+    with _singleton_lock:
+        if _vector_store is None:
+            _vector_store = VectorStore()
+        if signature != _vector_store_mtime and not _pending_chunks:
+            # Load existing vector store if available
+            try:
+                _vector_store.load(VECTOR_STORE_PATH)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError) as e:
+                logger.warning(f"Could not load vector store, starting empty: {e}")
+            _vector_store_mtime = signature
+    return _vector_store
+
+def _save_vector_store(store: VectorStore):
+    """Persist the shared vector store and remember the new mtimes so it is not reloaded."""
+    with _singleton_lock:
+        _write_vector_store(store)
+
+def _write_vector_store(store: VectorStore):
+    """Save the store and reset the debounce state; the caller holds _singleton_lock."""
+    global _vector_store_mtime, _pending_chunks, _last_vector_store_save, _flush_timer
+    store.save(VECTOR_STORE_PATH)
+    _vector_store_mtime = _vector_store_signature()
+    _pending_chunks = 0
+    _last_vector_store_save = time.monotonic()
+    if _flush_timer is not None:
+        _flush_timer.cancel()
+        _flush_timer = None
+
+def _save_vector_store_debounced(store: VectorStore, new_chunks: int):
+    """
+    Record newly added chunks and only rewrite the store once enough time or data has accumulated.
+    Otherwise a trailing flush is (re)scheduled, so pending chunks reach disk, and other
+    worker processes, SAVE_DEBOUNCE_SECONDS after the last add.
+    """
+    global _pending_chunks, _flush_timer
+    with _singleton_lock:
+        _pending_chunks += new_chunks
+        if (_pending_chunks >= SAVE_MAX_PENDING_CHUNKS
+                or time.monotonic() - _last_vector_store_save >= SAVE_DEBOUNCE_SECONDS):
+            _write_vector_store(store)
+            return
+        
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+        _flush_timer = threading.Timer(SAVE_DEBOUNCE_SECONDS, _flush_vector_store)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+@atexit.register
+def _flush_vector_store():
+    """Write out any chunks still pending (trailing debounce flush, and on process exit)."""
+    with _singleton_lock:
+        if _pending_chunks and _vector_store is not None:
+            _write_vector_store(_vector_store)
+
+def _get_web_searcher() -> WebSearcher:
+    """Return the shared web searcher (and its pooled HTTP session)."""
+    global _web_searcher
+    if _web_searcher is None:
+        with _singleton_lock:
+            if _web_searcher is None:
+                _web_searcher = WebSearcher()
+    return _web_searcher
+
+def _get_pdf_processor():
+    """Return the shared PDF processor, whose parsed documents are reused across queries."""
+    global _pdf_processor
+    if _pdf_processor is None:
+        with _singleton_lock:
+            if _pdf_processor is None:
+                from pdf_processor import PDFProcessor
+                _pdf_processor = PDFProcessor()
+    return _pdf_processor
+
+@lru_cache(maxsize=16)
+def _cached_extract_images(file_path: str, mtime_ns: int, wants_images: bool) -> List[Dict]:
+    """
+    Extract images from a PDF, memoized per file version. Extraction only depends on whether
+    the query asks for images, so that flag is the key rather than the (nearly unique) query;
+    entries hold base64 payloads, so the cache is kept small.
+    """
+    return _get_pdf_processor().extract_images_from_pdf(file_path, wants_images=wants_images)
+
+class ChatService:
+    def __init__(self):
+        self.openai_client = _get_openai_client()
+        self.vector_store = _get_vector_store()
+        self.web_searcher = _get_web_searcher()
+    
+    def process_pdf_chunks(self, text_chunks: List[str], document_id: int):
+        """Add PDF text chunks to the vector store."""
+        try:
+            self.vector_store.add_texts(text_chunks, document_id)
+            # Save the updated vector store (debounced during bulk ingestion)
+            _save_vector_store_debounced(self.vector_store, len(text_chunks))
+            logger.info(f"Processed {len(text_chunks)} chunks for document {document_id}")
+        except Exception as e:
+            logger.error(f"Error processing PDF chunks: {e}")
+            raise
+    
+    def generate_response(self, query: str, session_id: str, ai_role: str = "You are a helpful AI assistant.") -> Tuple[str, List[Dict]]:
+        """
+        Generate a response combining PDF content and web search results.
+        Returns the response text and a list of sources.
+        """
+        try:
+            messages, sources = self._build_messages(query, session_id, ai_role)
+            
+            # 3. Generate response using OpenAI
             response = self.openai_client.chat.completions.create(
                 model="gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024. do not change this unless explicitly requested by the user
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=messages,
                 max_tokens=800,
                 temperature=0.7
             )
@@ -141,6 +220,85 @@ Please provide a helpful answer based on the available context. Use 📘 to indi
             logger.error(f"Error generating response: {e}")
             return f"I apologize, but I encountered an error while processing your question: {str(e)}", []
     
+    def _build_messages(self, query: str, session_id: str, ai_role: str) -> Tuple[List[Dict], List[Dict]]:
+        """Search PDF and web content and assemble the chat messages and sources for a query."""
+        sources = []
+        context_parts = []
+        
+        # Get active document ids for current session only (no full ORM rows needed)
+        from app import db
+        from models import Document
+        active_doc_ids = {
+            doc_id for (doc_id,) in
+            db.session.query(Document.id).filter_by(session_id=session_id, is_active=True)
+        }
+        
+        # Start the web search in the background while the PDF search runs
+        web_future = _search_executor.submit(self.web_searcher.search_multiple_sources, query, 2)
+        
+        # 1. Search PDF content (filtered by session inside the index; nothing to search without active docs)
+        if active_doc_ids:
+            pdf_results = self.vector_store.search(query, k=5, allowed_doc_ids=active_doc_ids)
+        else:
+            pdf_results = []
+        
+        if pdf_results:
+            pdf_context = []
+            pdf_doc_ids = set()  # Track unique document IDs
+            for text, score, doc_id in pdf_results:
+                # Only include results from current session's active documents
+                if score > 0.1 and doc_id in active_doc_ids:
+                    # Only the top 3 chunks go into the prompt; every match still counts as a source
+                    if len(pdf_context) < 3:
+                        pdf_context.append(text)
+                    pdf_doc_ids.add(doc_id)
+            
+            # Add only one source entry for PDF documents (deduplicated)
+            if pdf_context:
+                context_parts.append(f"📘 **From PDF Documents:**\n{' '.join(pdf_context)}")
+                # Add a single PDF source entry
+                sources.append({
+                    'type': 'pdf',
+                    'content': f"Retrieved from {len(pdf_doc_ids)} PDF document(s)",
+                    'document_count': len(pdf_doc_ids)
+                })
+                
+                # Extract images if query suggests visual content is needed or content is found
+                should_extract_images = bool(_IMAGE_KEYWORDS_RE.search(query))
+                
+                # Extract images when there are relevant text chunks or visual keywords
+                if should_extract_images or len(pdf_results) > 0:
+                    logger.info(f"Attempting to extract images for query: {query}")
+                    self._extract_relevant_images(pdf_doc_ids, query, sources, pdf_results)
+        
+        # 2. Collect web content
+        web_results = web_future.result()
+        if web_results:
+            web_context = [f"{result['title']}: {result['snippet']}" for result in web_results]
+            sources.extend([
+                {
+                    'type': 'web',
+                    'title': result['title'],
+                    'snippet': result['snippet'],
+                    'url': result['url'],
+                    'source': result['source']
+                }
+                for result in web_results
+            ])
+            context_parts.append(f"🌐 **From Web Search:**\n{' '.join(web_context)}")
+        
+        context = "\n\n".join(context_parts) if context_parts else "No specific context found."
+        
+        # Use role-based system prompt if provided
+        system_prompt = ai_role + _ROLE_PROMPT_SUFFIX if ai_role else _DEFAULT_SYSTEM_PROMPT
+        user_prompt = _USER_PROMPT_TEMPLATE.format(context=context, query=query)
+        
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        return messages, sources
+    
     def get_vector_store_stats(self) -> Dict:
         """Get statistics about the vector store."""
         return {
@@ -176,26 +334,28 @@ Please provide a helpful answer based on the available context. Use 📘 to indi
                             logger.error(f"Error re-processing document {doc.id}: {e}")
                 
                 # Save the rebuilt vector store
-                self.vector_store.save("vector_store")
+                _save_vector_store(self.vector_store)
                 logger.info(f"Rebuilt vector store with {len(remaining_docs)} remaining documents")
             else:
                 # No documents left, clear and save empty store
-                self.vector_store.save("vector_store")
+                _save_vector_store(self.vector_store)
                 logger.info("Cleared vector store - no documents remaining")
                 
         except Exception as e:
             logger.error(f"Error clearing session data: {e}")
             # If rebuilding fails, just clear everything to be safe
             self.vector_store.clear()
-            self.vector_store.save("vector_store")
+            _save_vector_store(self.vector_store)
     
     def _extract_relevant_images(self, pdf_doc_ids: set, query: str, sources: list, relevant_chunks=None):
         """Extract images from PDFs based on content relevance and add them to sources."""
         try:
+            from sqlalchemy.orm import load_only
             from models import Document
-            from pdf_processor import PDFProcessor
             
-            pdf_processor = PDFProcessor()
+            # Extraction only depends on whether the query asks for images, so cache on that
+            from pdf_processor import query_wants_images
+            wants_images = query_wants_images(query)
             
             # Get page numbers from relevant chunks if available
             relevant_pages = set()
@@ -206,11 +366,21 @@ Please provide a helpful answer based on the available context. Use 📘 to indi
                         # For now, we'll extract from all pages but this could be enhanced
                         pass
             
-            for doc_id in pdf_doc_ids:
-                doc = Document.query.get(doc_id)
-                if doc and doc.file_path:
-                    # Extract images from this PDF with query-based filtering
-                    images = pdf_processor.extract_images_from_pdf(doc.file_path, query)
+            # Fetch all matched documents in one round-trip, only the columns used below
+            docs = (Document.query
+                    .options(load_only(Document.id, Document.filename, Document.file_path))
+                    .filter(Document.id.in_(pdf_doc_ids))
+                    .all())
+            
+            for doc in docs:
+                if doc.file_path:
+                    try:
+                        mtime_ns = os.stat(doc.file_path).st_mtime_ns
+                    except FileNotFoundError:
+                        continue
+                    
+                    # Extract images from this PDF with query-based filtering (cached per file version)
+                    images = _cached_extract_images(doc.file_path, mtime_ns, wants_images)
                     
                     if images:
                         # Filter images for relevance and size
@@ -226,8 +396,8 @@ Please provide a helpful answer based on the available context. Use 📘 to indi
                                 relevant_images.append(image)
                         
                         # Add relevant images to sources (limit to 3 per document)
-                        for i, image in enumerate(relevant_images[:3]):
-                            sources.append({
+                        sources.extend([
+                            {
                                 'type': 'image',
                                 'document': doc.filename,
                                 'page': image.get('page', 'Unknown'),
@@ -236,7 +406,9 @@ Please provide a helpful answer based on the available context. Use 📘 to indi
                                 'height': image.get('height', 0),
                                 'size': image.get('size', 0),
                                 'format': image.get('format', 'png')
-                            })
+                            }
+                            for image in relevant_images[:3]
+                        ])
                         
                         logger.info(f"Extracted {len(relevant_images)} relevant images from {doc.filename} (filtered from {len(images)} total)")
                         
@@ -5,13 +5,39 @@ Tests all core functionality before distribution
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 import os
 import time
+from functools import lru_cache
 from pathlib import Path
 
 BASE_URL = "http://localhost:5000"
 
+# One pooled keep-alive session for every request in the suite
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=20))
+
+@lru_cache(maxsize=64)
+def _cached_get(url):
+    """GET an idempotent endpoint once per run; call _cached_get.cache_clear() after mutations"""
+    return SESSION.get(url)
+
+def _post_with_backoff(url, **kwargs):
+    """POST once; if the server answers 429, wait for its Retry-After and retry once"""
+    response = SESSION.post(url, **kwargs)
+    if response.status_code == 429:
+        try:
+            retry_after = float(response.headers.get('Retry-After', 1))
+        except ValueError:  # HTTP-date form
+            retry_after = 1
+        time.sleep(retry_after)
+        response = SESSION.post(url, **kwargs)
+    return response
+
 def test_upload_functionality():
     """Test PDF upload functionality"""
     print("\n🔄 Testing PDF Upload...")
@@ -24,10 +50,11 @@ def test_upload_functionality():
     
     with open(test_pdf, 'rb') as f:
         files = {'file': f}
-        response = requests.post(f"{BASE_URL}/upload", files=files)
+        response = SESSION.post(f"{BASE_URL}/upload", files=files)
+    _cached_get.cache_clear()
     
     if response.status_code == 200:
-        result = response.json()
+        result = json_loads(response.content)
         if result.get('success'):
             print(f"✅ PDF uploaded successfully: {result.get('chunks', 0)} chunks processed")
             return True
@@ -49,37 +76,40 @@ def test_chat_functionality():
         "What are ionic compounds?"
     ]
     
-    for query in test_queries:
+    # Send every query in one batch request instead of one round-trip each
+    response = _post_with_backoff(f"{BASE_URL}/chat/batch", 
+                                  json={'messages': test_queries},
+                                  headers={'Content-Type': 'application/json'})
+    
+    if response.status_code != 200:
+        print(f"    ❌ Chat request failed: {response.status_code}")
+        return False
+    
+    batch = json_loads(response.content)
+    if not batch.get('success'):
+        print(f"    ❌ Chat failed: {batch.get('error')}")
+        return False
+    
+    for query, result in zip(test_queries, batch.get('data', {}).get('results', [])):
         print(f"  Testing query: {query}")
         
-        response = requests.post(f"{BASE_URL}/chat", 
-                               json={'message': query},
-                               headers={'Content-Type': 'application/json'})
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('success'):
-                answer = result.get('response', '')
-                sources = result.get('sources', [])
-                
-                # Check for chemical formulas that should be formatted
-                chemical_found = any(formula in answer for formula in ['H2O', 'CO2', 'H2SO4', 'NaCl'])
-                images_found = any(source.get('type') == 'image' for source in sources)
-                
-                print(f"    ✅ Response received ({len(answer)} chars)")
-                print(f"    📘 PDF sources: {len([s for s in sources if s.get('type') == 'pdf'])}")
-                print(f"    🌐 Web sources: {len([s for s in sources if s.get('type') == 'web'])}")
-                print(f"    🖼️ Images found: {len([s for s in sources if s.get('type') == 'image'])}")
-                
-                if chemical_found:
-                    print("    🧪 Chemical formulas detected")
-                
-                time.sleep(1)  # Rate limiting
-            else:
-                print(f"    ❌ Chat failed: {result.get('error')}")
-                return False
+        if result.get('success'):
+            answer = result.get('response', '')
+            sources = result.get('sources', [])
+            
+            # Check for chemical formulas that should be formatted
+            chemical_found = any(formula in answer for formula in ['H2O', 'CO2', 'H2SO4', 'NaCl'])
+            images_found = any(source.get('type') == 'image' for source in sources)
+            
+            print(f"    ✅ Response received ({len(answer)} chars)")
+            print(f"    📘 PDF sources: {len([s for s in sources if s.get('type') == 'pdf'])}")
+            print(f"    🌐 Web sources: {len([s for s in sources if s.get('type') == 'web'])}")
+            print(f"    🖼️ Images found: {len([s for s in sources if s.get('type') == 'image'])}")
+            
+            if chemical_found:
+                print("    🧪 Chemical formulas detected")
         else:
-            print(f"    ❌ Chat request failed: {response.status_code}")
+            print(f"    ❌ Chat failed: {result.get('error')}")
             return False
     
     return True
@@ -90,12 +120,15 @@ def test_tts_functionality():
     
     test_text = "Water has the chemical formula H2O, consisting of two hydrogen atoms and one oxygen atom."
     
-    response = requests.post(f"{BASE_URL}/tts", 
-                           json={'text': test_text, 'voice': 'nova'},
-                           headers={'Content-Type': 'application/json'})
+    # Stream the audio and only count its bytes instead of buffering the whole body
+    with SESSION.post(f"{BASE_URL}/tts", 
+                      json={'text': test_text, 'voice': 'nova'},
+                      headers={'Content-Type': 'application/json'},
+                      stream=True) as response:
+        status_code = response.status_code
+        audio_size = sum(len(block) for block in response.iter_content(65536)) if status_code == 200 else 0
     
-    if response.status_code == 200:
-        audio_size = len(response.content)
+    if status_code == 200:
         if audio_size > 1000:  # Audio should be reasonably sized
             print(f"✅ TTS working: {audio_size} bytes of audio generated")
             return True
@@ -103,7 +136,7 @@ def test_tts_functionality():
             print("❌ TTS audio too small")
             return False
     else:
-        print(f"❌ TTS request failed: {response.status_code}")
+        print(f"❌ TTS request failed: {status_code}")
         return False
 
 def test_document_management():
@@ -111,15 +144,16 @@ def test_document_management():
     print("\n🔄 Testing Document Management...")
     
     # Get documents
-    response = requests.get(f"{BASE_URL}/documents")
+    response = _cached_get(f"{BASE_URL}/documents")
     if response.status_code == 200:
-        documents = response.json()
+        documents = json_loads(response.content)
         if documents:
             print(f"✅ Document listing working: {len(documents)} documents found")
             
             # Test document toggle (if any documents exist)
             doc_id = documents[0]['id']
-            toggle_response = requests.post(f"{BASE_URL}/documents/{doc_id}/toggle")
+            toggle_response = SESSION.post(f"{BASE_URL}/documents/{doc_id}/toggle")
+            _cached_get.cache_clear()
             if toggle_response.status_code == 200:
                 print("✅ Document toggle working")
             else:
@@ -138,9 +172,9 @@ def test_profile_management():
     print("\n🔄 Testing Profile Management...")
     
     # Get profile
-    response = requests.get(f"{BASE_URL}/profile")
+    response = _cached_get(f"{BASE_URL}/profile")
     if response.status_code == 200:
-        profile = response.json()
+        profile = json_loads(response.content)
         print(f"✅ Profile retrieval working: {profile.get('ai_role', 'default')[:50]}...")
         
         # Update profile
@@ -149,9 +183,10 @@ def test_profile_management():
             'theme_preference': 'dark'
         }
         
-        update_response = requests.post(f"{BASE_URL}/profile", 
-                                      json=update_data,
-                                      headers={'Content-Type': 'application/json'})
+        update_response = SESSION.post(f"{BASE_URL}/profile", 
+                                     json=update_data,
+                                     headers={'Content-Type': 'application/json'})
+        _cached_get.cache_clear()
         
         if update_response.status_code == 200:
             print("✅ Profile update working")
@@ -167,9 +202,9 @@ def test_statistics():
     """Test statistics endpoint"""
     print("\n🔄 Testing Statistics...")
     
-    response = requests.get(f"{BASE_URL}/stats")
+    response = SESSION.get(f"{BASE_URL}/stats")
     if response.status_code == 200:
-        stats = response.json()
+        stats = json_loads(response.content)
         print(f"✅ Statistics working:")
         print(f"    Documents: {stats.get('total_documents', 0)}")
         print(f"    Messages: {stats.get('total_messages', 0)}")
@@ -183,7 +218,7 @@ def test_theme_switching():
     """Test that the application loads properly"""
     print("\n🔄 Testing Main Application...")
     
-    response = requests.get(BASE_URL)
+    response = SESSION.get(BASE_URL)
     if response.status_code == 200:
         content = response.text
         
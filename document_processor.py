@@ -1,19 +1,124 @@
 import os
+import re
 import logging
-from typing import Generator, List, Dict
+from collections import Counter, deque
+from itertools import repeat
+from typing import Generator, List, Dict, Optional, Tuple
 import pdfplumber
 import docx
 from pathlib import Path
 
+from pdf_processor import MAX_EXTRACT_WORKERS, _get_extract_pool
+
+try:
+    import pymupdf as fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Chemical formula mappings
+_SUBSCRIPT_MAP = {
+    '₀': '0', '₁': '1', '₂': '2', '₃': '3', '₄': '4', '₅': '5', '₆': '6', '₇': '7', '₈': '8', '₉': '9',
+    'ₐ': 'a', 'ₑ': 'e', 'ᵢ': 'i', 'ₒ': 'o', 'ᵤ': 'u', 'ₓ': 'x', 'ₙ': 'n', 'ₘ': 'm', 'ₚ': 'p', 'ₛ': 's', 'ₜ': 't'
+}
+
+_SUPERSCRIPT_MAP = {
+    '⁰': '0', '¹': '1', '²': '2', '³': '3', '⁴': '4', '⁵': '5', '⁶': '6', '⁷': '7', '⁸': '8', '⁹': '9',
+    'ᵃ': 'a', 'ᵇ': 'b', 'ᶜ': 'c', 'ᵈ': 'd', 'ᵉ': 'e', 'ᶠ': 'f', 'ᵍ': 'g', 'ʰ': 'h', 'ⁱ': 'i', 'ʲ': 'j',
+    'ᵏ': 'k', 'ˡ': 'l', 'ᵐ': 'm', 'ⁿ': 'n', 'ᵒ': 'o', 'ᵖ': 'p', 'ʳ': 'r', 'ˢ': 's', 'ᵗ': 't', 'ᵘ': 'u',
+    'ᵛ': 'v', 'ʷ': 'w', 'ˣ': 'x', 'ʸ': 'y', 'ᶻ': 'z', '⁺': '+', '⁻': '-', '⁼': '='
+}
+
+# Subscripts become underscore notation, superscripts caret notation
+_SPECIAL_CHARS_TABLE = str.maketrans({
+    **{sub: f'_{normal}' for sub, normal in _SUBSCRIPT_MAP.items()},
+    **{sup: f'^{normal}' for sup, normal in _SUPERSCRIPT_MAP.items()},
+})
+
+# Same conversions, plus deleting non-printable control characters in the same pass.
+# Control characters that count as whitespace (\x0B, \x0C, \x1C-\x1F) are left for the
+# whitespace collapse, exactly as when they were stripped by a separate regex afterwards.
+_CLEAN_TEXT_TABLE = {
+    **_SPECIAL_CHARS_TABLE,
+    **{code: None for code in [*range(0x00, 0x20), 0x7F] if not chr(code).isspace()},
+}
+
+# PDFs with at least this many pages are extracted in parallel, PAGES_PER_TASK pages per worker task
+PARALLEL_PAGE_THRESHOLD = 32
+PAGES_PER_TASK = 16
+
+def _extract_page_text(page, page_num: int) -> Optional[str]:
+    """Extract one pdfplumber page, logging and skipping pages that fail."""
+    try:
+        return page.extract_text()
+    except Exception as extract_error:
+        logger.warning(f"Failed to extract text from page {page_num + 1} with pdfplumber: {extract_error}")
+        return None
+    finally:
+        # Drop the page's cached chars/lines/rects; pdf.pages keeps every page alive otherwise
+        page.close()
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> List[Optional[str]]:
+    """Extract pages [start, stop) in a worker process, opening the PDF once per range."""
+    with pdfplumber.open(pdf_path) as pdf:
+        return [_extract_page_text(pdf.pages[page_num], page_num) for page_num in range(start, stop)]
+
+def _count_lines(file_path: str) -> int:
+    """Count lines by scanning raw bytes in 1MB blocks, without decoding or holding the file."""
+    line_count = 0
+    last_block = b''
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            line_count += block.count(b'\n')
+            last_block = block
+    
+    # A final line without a trailing newline still counts, as it did with readlines()
+    if last_block and not last_block.endswith(b'\n'):
+        line_count += 1
+    return line_count
+
+class _ChunkBuffer:
+    """
+    Rolling word buffer that cuts fixed-size chunks, starting each chunk with the
+    last `overlap` words of the previous one.
+    """
+    
+    def __init__(self, chunk_size: int, overlap: int = 0):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.words = deque()
+        self.carried = 0  # Words at the head that were already emitted as the previous chunk's tail
+    
+    def add(self, words: List[str]) -> Generator[str, None, None]:
+        """Append words and yield every chunk that is now complete."""
+        self.words.extend(words)
+        while len(self.words) >= self.chunk_size:
+            chunk_words = [self.words.popleft() for _ in range(self.chunk_size)]
+            yield " ".join(chunk_words)
+            if self.overlap:
+                self.words.extendleft(reversed(chunk_words[-self.overlap:]))
+            self.carried = self.overlap
+    
+    def flush(self) -> Generator[str, None, None]:
+        """Yield the final partial chunk, unless it holds nothing but carried-over words."""
+        if len(self.words) > self.carried:
+            yield " ".join(self.words)
+        self.words.clear()
+
 class DocumentProcessor:
     """
     Multi-format document processor supporting PDF, DOCX, TXT, and MD files.
     """
     
-    def __init__(self, chunk_size: int = 1000):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 0):
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be at least 0 and smaller than chunk_size")
         self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
         self.supported_formats = {'.pdf', '.docx', '.txt', '.md'}
     
     def is_supported_format(self, filename: str) -> bool:
@@ -40,89 +145,102 @@ class DocumentProcessor:
             logger.error(f"Error extracting text from {file_path}: {e}")
             raise
     
-    def _extract_pdf_text(self, pdf_path: str) -> Generator[str, None, None]:
-        """Extract text from PDF using pdfplumber with PyMuPDF fallback."""
+    def _extract_pdf_text(self, pdf_path: str, doc=None) -> Generator[str, None, None]:
+        """Extract text from PDF using PyMuPDF with pdfplumber fallback."""
+        if PYMUPDF_AVAILABLE:
+            yielded = False
+            try:
+                for chunk in self._extract_pdf_text_pymupdf(pdf_path, doc):
+                    yielded = True
+                    yield chunk
+            except Exception as e:
+                # Chunks already handed out cannot be re-extracted consistently by another backend
+                if yielded:
+                    raise ValueError(f"Failed to process PDF: {str(e)}")
+                logger.warning(f"PyMuPDF extraction failed, falling back to pdfplumber: {e}")
+            
+            if yielded:
+                return
+            logger.info(f"PyMuPDF found no text in {pdf_path}, trying pdfplumber")
+        
+        yield from self._extract_pdf_text_pdfplumber(pdf_path)
+    
+    def _extract_pdf_text_pymupdf(self, pdf_path: str, doc=None) -> Generator[str, None, None]:
+        """Extract text from PDF using PyMuPDF's C-backed text extraction, reusing `doc` if already open."""
+        if doc is None:
+            doc = fitz.open(pdf_path)
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                current_chunk = ""
+            buffer = self._new_chunk_buffer()
+            
+            for page in doc.pages():
+                text = page.get_text()
+                if text:
+                    yield from buffer.add(self._clean_text(text).split())
+            
+            yield from buffer.flush()
+        finally:
+            doc.close()
+    
+    def _extract_pdf_text_pdfplumber(self, pdf_path: str, pdf=None) -> Generator[str, None, None]:
+        """Extract text from PDF using pdfplumber (slower, handles some files PyMuPDF cannot)."""
+        try:
+            with pdf if pdf is not None else pdfplumber.open(pdf_path) as pdf:
+                buffer = self._new_chunk_buffer()
                 
-                for page_num, page in enumerate(pdf.pages):
+                for page_num, text in enumerate(self._iter_pdfplumber_page_texts(pdf, pdf_path)):
                     try:
-                        # Add timeout and error handling for problematic PDFs
-                        text = None
-                        try:
-                            text = page.extract_text()
-                        except Exception as extract_error:
-                            logger.warning(f"Failed to extract text from page {page_num + 1} with pdfplumber: {extract_error}")
-                            continue
-                            
                         if text:
-                            clean_text = self._clean_text(text)
-                            current_chunk += " " + clean_text
-                            
-                            # Check if chunk is large enough
-                            if len(current_chunk.split()) >= self.chunk_size:
-                                words = current_chunk.split()
-                                chunk = " ".join(words[:self.chunk_size])
-                                yield chunk
-                                current_chunk = " ".join(words[self.chunk_size:])
+                            yield from buffer.add(self._clean_text(text).split())
                     except Exception as page_error:
                         logger.warning(f"Error on PDF page {page_num + 1}: {page_error}")
                         continue
                 
                 # Yield remaining chunk
-                if current_chunk.strip():
-                    yield current_chunk
+                yield from buffer.flush()
                     
-        except (Exception, SystemExit, BaseException) as e:
+        except (Exception, SystemExit) as e:
             logger.error(f"PDF extraction failed: {e} (type: {type(e).__name__})")
-            # Fallback to PyMuPDF if available
-            try:
-                import pymupdf as fitz
-                doc = fitz.open(pdf_path)
-                current_chunk = ""
-                
-                for page_num in range(len(doc)):
-                    page = doc[page_num]
-                    text = page.get_text()
-                    if text:
-                        clean_text = self._clean_text(text)
-                        current_chunk += " " + clean_text
-                        
-                        if len(current_chunk.split()) >= self.chunk_size:
-                            words = current_chunk.split()
-                            chunk = " ".join(words[:self.chunk_size])
-                            yield chunk
-                            current_chunk = " ".join(words[self.chunk_size:])
-                
-                if current_chunk.strip():
-                    yield current_chunk
-                    
-                doc.close()
-            except ImportError:
-                raise ValueError(f"Failed to process PDF: {str(e)}")
+            raise ValueError(f"Failed to process PDF: {str(e)}")
+    
+    def _iter_pdfplumber_page_texts(self, pdf, pdf_path: str) -> Generator[Optional[str], None, None]:
+        """
+        Yield the text of each page in order.
+        Large PDFs are split into page ranges extracted in parallel worker processes,
+        since pdfplumber's layout analysis is CPU-bound Python.
+        """
+        page_count = len(pdf.pages)
+        workers = min(os.cpu_count() or 1, MAX_EXTRACT_WORKERS)
+        
+        if page_count < PARALLEL_PAGE_THRESHOLD or workers <= 1:
+            for page_num, page in enumerate(pdf.pages):
+                yield _extract_page_text(page, page_num)
+            return
+        
+        starts = range(0, page_count, PAGES_PER_TASK)
+        stops = [min(start + PAGES_PER_TASK, page_count) for start in starts]
+        
+        # Reuse the long-lived forkserver pool PDFProcessor extracts with
+        for texts in _get_extract_pool(workers).map(_extract_page_range, repeat(pdf_path), starts, stops):
+            yield from texts
+    
+    def _new_chunk_buffer(self) -> _ChunkBuffer:
+        """Create the rolling word buffer shared by all extractors."""
+        return _ChunkBuffer(self.chunk_size, self.chunk_overlap)
     
-    def _extract_docx_text(self, docx_path: str) -> Generator[str, None, None]:
+    def _extract_docx_text(self, docx_path: str, doc=None) -> Generator[str, None, None]:
         """Extract text from DOCX files."""
         try:
-            doc = docx.Document(docx_path)
-            current_chunk = ""
+            if doc is None:
+                doc = docx.Document(docx_path)
+            buffer = self._new_chunk_buffer()
             
             for paragraph in doc.paragraphs:
                 text = paragraph.text.strip()
                 if text:
-                    current_chunk += " " + text
-                    
-                    # Check if chunk is large enough
-                    if len(current_chunk.split()) >= self.chunk_size:
-                        words = current_chunk.split()
-                        chunk = " ".join(words[:self.chunk_size])
-                        yield chunk
-                        current_chunk = " ".join(words[self.chunk_size:])
+                    yield from buffer.add(text.split())
             
             # Yield remaining chunk
-            if current_chunk.strip():
-                yield current_chunk
+            yield from buffer.flush()
                 
         except Exception as e:
             logger.error(f"DOCX extraction failed: {e}")
@@ -132,78 +250,41 @@ class DocumentProcessor:
         """Extract text from plain text and markdown files."""
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
-                current_chunk = ""
+                buffer = self._new_chunk_buffer()
                 
                 for line in file:
-                    line = line.strip()
-                    if line:
-                        current_chunk += " " + line
-                        
-                        # Check if chunk is large enough
-                        if len(current_chunk.split()) >= self.chunk_size:
-                            words = current_chunk.split()
-                            chunk = " ".join(words[:self.chunk_size])
-                            yield chunk
-                            current_chunk = " ".join(words[self.chunk_size:])
+                    yield from buffer.add(line.split())
                 
                 # Yield remaining chunk
-                if current_chunk.strip():
-                    yield current_chunk
+                yield from buffer.flush()
                     
         except UnicodeDecodeError:
             # Try with different encoding
             try:
                 with open(file_path, 'r', encoding='latin-1') as file:
-                    content = file.read()
-                    clean_content = self._clean_text(content)
-                    words = clean_content.split()
-                    
-                    for i in range(0, len(words), self.chunk_size):
-                        chunk = " ".join(words[i:i + self.chunk_size])
-                        yield chunk
+                    buffer = self._new_chunk_buffer()
+                    for line in file:
+                        yield from buffer.add(self._clean_text(line).split())
+                    yield from buffer.flush()
             except Exception as e:
                 logger.error(f"Text file extraction failed: {e}")
                 raise ValueError(f"Failed to process text file: {str(e)}")
     
     def _clean_text(self, text: str) -> str:
         """Clean extracted text while preserving chemical equations and special characters."""
-        import re
-        
-        # Convert Unicode special characters first
-        text = self._convert_special_characters(text)
+        # Convert Unicode special characters and drop non-printable control characters
+        # in one pass, keeping special chars
+        text = text.translate(_CLEAN_TEXT_TABLE)
         
         # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Only remove non-printable control characters, keep special chars
-        text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', text)
+        text = _WHITESPACE_RE.sub(' ', text)
         
         return text.strip()
     
     def _convert_special_characters(self, text: str) -> str:
         """Convert Unicode superscripts, subscripts, and special characters to readable format."""
-        # Chemical formula mappings
-        subscript_map = {
-            '₀': '0', '₁': '1', '₂': '2', '₃': '3', '₄': '4', '₅': '5', '₆': '6', '₇': '7', '₈': '8', '₉': '9',
-            'ₐ': 'a', 'ₑ': 'e', 'ᵢ': 'i', 'ₒ': 'o', 'ᵤ': 'u', 'ₓ': 'x', 'ₙ': 'n', 'ₘ': 'm', 'ₚ': 'p', 'ₛ': 's', 'ₜ': 't'
-        }
-        
-        superscript_map = {
-            '⁰': '0', '¹': '1', '²': '2', '³': '3', '⁴': '4', '⁵': '5', '⁶': '6', '⁷': '7', '⁸': '8', '⁹': '9',
-            'ᵃ': 'a', 'ᵇ': 'b', 'ᶜ': 'c', 'ᵈ': 'd', 'ᵉ': 'e', 'ᶠ': 'f', 'ᵍ': 'g', 'ʰ': 'h', 'ⁱ': 'i', 'ʲ': 'j',
-            'ᵏ': 'k', 'ˡ': 'l', 'ᵐ': 'm', 'ⁿ': 'n', 'ᵒ': 'o', 'ᵖ': 'p', 'ʳ': 'r', 'ˢ': 's', 'ᵗ': 't', 'ᵘ': 'u',
-            'ᵛ': 'v', 'ʷ': 'w', 'ˣ': 'x', 'ʸ': 'y', 'ᶻ': 'z', '⁺': '+', '⁻': '-', '⁼': '='
-        }
-        
-        # Apply subscript conversions with underscore notation
-        for sub, normal in subscript_map.items():
-            text = text.replace(sub, f'_{normal}')
-        
-        # Apply superscript conversions with caret notation
-        for sup, normal in superscript_map.items():
-            text = text.replace(sup, f'^{normal}')
-        
-        return text
+        # Single pass over the text using the precomputed table
+        return text.translate(_SPECIAL_CHARS_TABLE)
     
     def get_document_info(self, file_path: str) -> dict:
         """Get basic information about the document."""
@@ -224,8 +305,7 @@ class DocumentProcessor:
                 doc = docx.Document(file_path)
                 info['pages'] = len(doc.paragraphs)
             elif file_ext in ['.txt', '.md']:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    info['pages'] = len(file.readlines())
+                info['pages'] = _count_lines(file_path)
             
             return info
             
@@ -233,6 +313,53 @@ class DocumentProcessor:
             logger.error(f"Error getting document info: {str(e)}")
             raise ValueError(f"Cannot read document file: {str(e)}")
     
+    def open_document(self, file_path: str) -> Tuple[dict, Generator[str, None, None]]:
+        """
+        Open a document once and return its info together with a chunk generator
+        that reads from the same handle. The generator closes the handle when
+        exhausted, so callers should consume it.
+        """
+        file_ext = Path(file_path).suffix.lower()
+        
+        try:
+            info = {
+                'filename': os.path.basename(file_path),
+                'file_size': os.path.getsize(file_path),
+                'format': file_ext,
+                'pages': 0
+            }
+            
+            if file_ext == '.pdf':
+                doc = None
+                if PYMUPDF_AVAILABLE:
+                    try:
+                        doc = fitz.open(file_path)
+                    except Exception as e:
+                        logger.warning(f"PyMuPDF could not open {file_path}, falling back to pdfplumber: {e}")
+                
+                if doc is not None:
+                    info['pages'] = len(doc)
+                    chunks = self._extract_pdf_text(file_path, doc)
+                else:
+                    pdf = pdfplumber.open(file_path)
+                    info['pages'] = len(pdf.pages)
+                    chunks = self._extract_pdf_text_pdfplumber(file_path, pdf)
+            elif file_ext == '.docx':
+                doc = docx.Document(file_path)
+                info['pages'] = len(doc.paragraphs)
+                chunks = self._extract_docx_text(file_path, doc)
+            elif file_ext in ['.txt', '.md']:
+                info['pages'] = _count_lines(file_path)
+                chunks = self._extract_text_file(file_path)
+            else:
+                raise ValueError(f"Unsupported file format: {file_ext}")
+            
+            return info, chunks
+            
+        except Exception as e:
+            logger.error(f"Error opening document: {str(e)}")
+            raise ValueError(f"Cannot read document file: {str(e)}")
+    
     def compare_documents(self, doc_paths: List[str]) -> Dict:
         """
         Compare multiple documents and find common themes/differences.
@@ -241,49 +368,45 @@ class DocumentProcessor:
             return {'error': 'Need at least 2 documents to compare'}
         
         try:
-            doc_contents = {}
+            word_counts = {}
+            doc_words = {}
+            common_words = None
             
-            # Extract text from each document
+            # Stream each document's chunks straight into its word count and word set
             for doc_path in doc_paths:
                 filename = os.path.basename(doc_path)
-                chunks = list(self.extract_text_chunks(doc_path))
-                doc_contents[filename] = ' '.join(chunks)
+                count = 0
+                words = set()
+                
+                for chunk in self.extract_text_chunks(doc_path):
+                    chunk_words = chunk.split()
+                    count += len(chunk_words)
+                    words.update(word.lower() for word in chunk_words if len(word) > 3)
+                
+                word_counts[filename] = count
+                doc_words[filename] = words
+                # Fold the intersection as documents arrive; it only ever shrinks
+                common_words = words if common_words is None else common_words & words
             
             # Basic comparison metrics
             comparison = {
-                'documents': list(doc_contents.keys()),
-                'word_counts': {},
+                'documents': list(word_counts.keys()),
+                'word_counts': word_counts,
                 'common_themes': [],
                 'unique_content': {}
             }
             
-            # Calculate word counts
-            for filename, content in doc_contents.items():
-                words = content.split()
-                comparison['word_counts'][filename] = len(words)
+            # Common words across all documents were folded in while reading them
+            comparison['common_themes'] = list(common_words or ())[:20]  # Top 20 common themes
             
-            # Find common and unique words (simplified approach)
-            all_words = set()
-            doc_words = {}
-            
-            for filename, content in doc_contents.items():
-                words = set(word.lower() for word in content.split() if len(word) > 3)
-                doc_words[filename] = words
-                all_words.update(words)
+            # Find unique content per document: words that appear in exactly one document
+            doc_frequency = Counter()
+            for words in doc_words.values():
+                doc_frequency.update(words)
             
-            # Find common words across all documents
-            common_words = set.intersection(*doc_words.values()) if doc_words else set()
-            comparison['common_themes'] = list(common_words)[:20]  # Top 20 common themes
-            
-            # Find unique content per document
             for filename, words in doc_words.items():
-                other_words = set()
-                for other_file, other_word_set in doc_words.items():
-                    if other_file != filename:
-                        other_words.update(other_word_set)
-                
-                unique_words = words - other_words
-                comparison['unique_content'][filename] = list(unique_words)[:15]  # Top 15 unique words
+                unique_words = [word for word in words if doc_frequency[word] == 1]
+                comparison['unique_content'][filename] = unique_words[:15]  # Top 15 unique words
             
             return comparison
             
@@ -4,7 +4,10 @@ Comprehensive test of all PDF Chat functionality
 """
 
 import requests
-import json
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 import os
 from pathlib import Path
 
@@ -37,7 +40,7 @@ def test_complete_workflow():
         response = session.get(f"{BASE_URL}/profile")
         print(f"✅ Profile endpoint: {response.status_code}")
         if response.status_code == 200:
-            profile = response.json()
+            profile = json_loads(response.content)
             print(f"   👤 AI Role: {profile.get('ai_role', 'Unknown')[:50]}...")
     except Exception as e:
         print(f"❌ Profile error: {e}")
@@ -47,7 +50,7 @@ def test_complete_workflow():
         response = session.get(f"{BASE_URL}/documents")
         print(f"✅ Documents endpoint: {response.status_code}")
         if response.status_code == 200:
-            docs = response.json()
+            docs = json_loads(response.content)
             print(f"   📚 Initial documents: {len(docs)}")
     except Exception as e:
         print(f"❌ Documents error: {e}")
@@ -70,7 +73,7 @@ def test_complete_workflow():
                 print(f"✅ Upload response: {response.status_code}")
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    result = json_loads(response.content)
                     print(f"   📄 Filename: {result.get('filename', 'Unknown')}")
                     print(f"   📊 Chunks: {result.get('chunk_count', 0)}")
                     uploaded = True
@@ -89,7 +92,7 @@ def test_complete_workflow():
     try:
         response = session.get(f"{BASE_URL}/documents")
         if response.status_code == 200:
-            docs = response.json()
+            docs = json_loads(response.content)
             print(f"✅ Documents after upload: {len(docs)}")
             for doc in docs:
                 print(f"   📄 {doc.get('filename', 'Unknown')} - {doc.get('chunk_count', 0)} chunks")
@@ -103,7 +106,7 @@ def test_complete_workflow():
         print(f"✅ Chat response: {chat_response.status_code}")
         
         if chat_response.status_code == 200:
-            chat_result = chat_response.json()
+            chat_result = json_loads(chat_response.content)
             response_text = chat_result.get('response', '')
             sources = chat_result.get('sources', [])
             
@@ -126,7 +129,7 @@ def test_complete_workflow():
         response = session.post(f"{BASE_URL}/clear-chat")
         print(f"✅ Clear chat: {response.status_code}")
         if response.status_code == 200:
-            result = response.json()
+            result = json_loads(response.content)
             print(f"   🧹 {result.get('message', 'Chat cleared')}")
     except Exception as e:
         print(f"❌ Clear chat error: {e}")
@@ -136,7 +139,7 @@ def test_complete_workflow():
         response = session.post(f"{BASE_URL}/clear-session")
         print(f"✅ Clear session: {response.status_code}")
         if response.status_code == 200:
-            result = response.json()
+            result = json_loads(response.content)
             print(f"   🗑️ {result.get('message', 'Session cleared')}")
     except Exception as e:
         print(f"❌ Clear session error: {e}")
@@ -1,8 +1,14 @@
+import json
 from app import db
 from datetime import datetime
-import json
+from sqlalchemy.dialects.postgresql import JSONB
 
 class Document(db.Model):
+    __table_args__ = (
+        # Chat lookups always filter on the session's active documents
+        db.Index('ix_document_session_active', 'session_id', 'is_active'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(255), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
@@ -43,12 +49,17 @@ class UserProfile(db.Model):
         }
 
 class ChatMessage(db.Model):
+    __table_args__ = (
+        # History and message-count queries filter by session and order by time
+        db.Index('ix_chat_message_session_timestamp', 'session_id', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(255), nullable=False)
     message_type = db.Column(db.String(50), nullable=False)  # 'user' or 'assistant'
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    sources = db.Column(db.Text)  # JSON string of sources
+    sources = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'))  # List of source dicts, binary JSONB on Postgres
     ai_role_used = db.Column(db.Text)  # Store the AI role used for this response
     
     def to_dict(self):
@@ -57,5 +68,6 @@ class ChatMessage(db.Model):
             'message_type': self.message_type,
             'content': self.content,
             'timestamp': self.timestamp.isoformat(),
-            'sources': json.loads(self.sources) if self.sources else []
+            # Rows from a TEXT column not yet altered to json/jsonb still come back as strings
+            'sources': json.loads(self.sources) if isinstance(self.sources, str) else self.sources or []
         }
@@ -3,9 +3,13 @@ Refactored routes using clean service layer architecture.
 All business logic moved to services, routes only handle HTTP concerns.
 """
 
+import io
 import os
 import logging
-from flask import render_template, request, jsonify, session
+import threading
+from collections import OrderedDict
+from itertools import islice
+from flask import render_template, request, jsonify, session, send_file, g, Response, stream_with_context
 
 from app import app
 from services import DocumentService, ChatService, SessionService, ComparisonService
@@ -20,17 +24,45 @@ tts_service = TTSService()
 
 logger = logging.getLogger(__name__)
 
+# Recently generated TTS audio by file name, so playback is served from memory
+# instead of re-reading the temp file; older entries still come from disk
+AUDIO_CACHE_SIZE = 32
+_audio_cache = OrderedDict()
+_audio_cache_lock = threading.Lock()
+
+def _cache_audio(filename: str, audio_data: bytes):
+    """Remember audio under its file name, evicting the least recently used entry."""
+    with _audio_cache_lock:
+        _audio_cache[filename] = audio_data
+        _audio_cache.move_to_end(filename)
+        while len(_audio_cache) > AUDIO_CACHE_SIZE:
+            _audio_cache.popitem(last=False)
+
+def _get_cached_audio(filename: str):
+    """Return cached audio for a file name, or None."""
+    with _audio_cache_lock:
+        audio_data = _audio_cache.get(filename)
+        if audio_data is not None:
+            _audio_cache.move_to_end(filename)
+        return audio_data
+
+@app.before_request
+def load_session_id():
+    """Resolve the session ID once per request; handlers read it from g."""
+    if request.endpoint != 'static':
+        g.session_id = session_service.get_or_create_session_id(request)
+
 @app.route('/')
 def index():
     """Main chat interface."""
-    session_id = session_service.get_or_create_session_id(request)
+    session_id = g.session_id
     return render_template('index.html')
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """Handle document upload."""
     try:
-        session_id = session_service.get_or_create_session_id(request)
+        session_id = g.session_id
         
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': 'No file provided'}), 400
@@ -40,7 +72,7 @@ def upload_file():
         
         if result['success']:
             # Update vector store with new document
-            chat_service.update_vector_store(session_id)
+            chat_service.schedule_vector_store_update(session_id)
             
             # Ensure proper response format for frontend
             response_data = {
@@ -67,7 +99,7 @@ def upload_file():
 def chat():
     """Handle chat messages."""
     try:
-        session_id = session_service.get_or_create_session_id(request)
+        session_id = g.session_id
         data = request.get_json()
         
         if not data or 'message' not in data:
@@ -84,14 +116,68 @@ def chat():
         logger.error(f"Chat error: {e}")
         return jsonify({'success': False, 'error': 'Chat processing failed'}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle a chat message, streaming the answer as server-sent events."""
+    session_id = g.session_id
+    data = request.get_json(silent=True)
+    
+    if not data or not isinstance(data.get('message'), str) or not data['message'].strip():
+        return jsonify({'success': False, 'error': 'No message provided'}), 400
+    
+    events = chat_service.stream_chat_message(data['message'], session_id)
+    
+    def generate():
+        for event, payload in events:
+            yield f"event: {event}\ndata: {app.json.dumps(payload)}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """Handle several chat messages in a single request."""
+    try:
+        session_id = g.session_id
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('messages'), list) or not data['messages']:
+            return jsonify({'success': False, 'error': 'No messages provided'}), 400
+        
+        messages = data['messages']
+        if len(messages) > chat_service.MAX_BATCH_MESSAGES:
+            return jsonify({'success': False, 'error': f'At most {chat_service.MAX_BATCH_MESSAGES} messages per batch'}), 400
+        
+        if not all(isinstance(message, str) and message.strip() for message in messages):
+            return jsonify({'success': False, 'error': 'Every message must be a non-empty string'}), 400
+        
+        result = chat_service.process_chat_batch(messages, session_id)
+        
+        return jsonify(result), 200 if result['success'] else 400
+            
+    except Exception as e:
+        logger.error(f"Batch chat error: {e}")
+        return jsonify({'success': False, 'error': 'Batch chat processing failed'}), 500
+
 @app.route('/documents', methods=['GET'])
 def get_documents():
     """Get list of uploaded documents for current session."""
     try:
-        session_id = session_service.get_or_create_session_id(request)
-        documents = document_service.get_session_documents(session_id)
+        session_id = g.session_id
+        batch_size = document_service.DOCUMENT_BATCH_SIZE
+        documents = document_service.iter_session_documents(session_id, batch_size)
+        
+        # Encode the first batch before responding, so query and encoding errors there still get the
+        # 500 below; an error in a later batch can only cut the already-started 200 response short
+        first_batch = ','.join(app.json.dumps(document) for document in islice(documents, batch_size))
         
-        return jsonify([doc.to_dict() for doc in documents]), 200
+        def generate():
+            # Encode and send the JSON list a batch at a time instead of building it whole
+            yield '[' + first_batch
+            while batch := list(islice(documents, batch_size)):
+                yield ',' + ','.join(app.json.dumps(document) for document in batch)
+            yield ']'
+        
+        return Response(stream_with_context(generate()), mimetype='application/json'), 200
         
     except Exception as e:
         logger.error(f"Get documents error: {e}")
@@ -101,12 +187,12 @@ def get_documents():
 def toggle_document(doc_id):
     """Toggle document inclusion in context."""
     try:
-        session_id = session_service.get_or_create_session_id(request)
+        session_id = g.session_id
         result = document_service.toggle_document_status(doc_id, session_id)
         
         if result['success']:
             # Update vector store after status change
-            chat_service.update_vector_store(session_id)
+            chat_service.schedule_vector_store_update(session_id)
             return jsonify(result), 200
         else:
             return jsonify(result), 400
@@ -119,12 +205,12 @@ def toggle_document(doc_id):
 def delete_document(doc_id):
     """Delete a specific document."""
     try:
-        session_id = session_service.get_or_create_session_id(request)
+        session_id = g.session_id
         result = document_service.delete_document(doc_id, session_id)
         
         if result['success']:
             # Update vector store after deletion
-            chat_service.update_vector_store(session_id)
+            chat_service.schedule_vector_store_update(session_id)
             return jsonify(result), 200
         else:
             return jsonify(result), 400
@@ -139,7 +225,7 @@ def delete_document(doc_id):
 def user_profile():
     """Manage user profile settings."""
     try:
-        session_id = session_service.get_or_create_session_id(request)
+        session_id = g.session_id
         
         if request.method == 'GET':
             profile = session_service.get_user_profile(session_id)
@@ -170,7 +256,7 @@ def user_profile():
 def clear_session():
     """Clear current session data."""
     try:
-        session_id = session_service.get_or_create_session_id(request)
+        session_id = g.session_id
         result = session_service.clear_session_data(session_id, 'all')
         
         # Clear vector store
@@ -187,7 +273,7 @@ def clear_session():
 def clear_chat():
     """Clear chat messages only, keep documents."""
     try:
-        session_id = session_service.get_or_create_session_id(request)
+        session_id = g.session_id
         result = session_service.clear_session_data(session_id, 'chat')
         
         return jsonify(result), 200 if result['success'] else 500
@@ -200,7 +286,7 @@ def clear_chat():
 def get_stats():
     """Get application statistics."""
     try:
-        session_id = session_service.get_or_create_session_id(request)
+        session_id = g.session_id
         stats = session_service.get_session_stats(session_id)
         
         return jsonify({'success': True, 'stats': stats}), 200
@@ -227,6 +313,7 @@ def text_to_speech():
         
         # Save to temporary file and return path
         filename = tts_service.save_audio_to_file(audio_data)
+        _cache_audio(os.path.basename(filename), audio_data)
         
         return jsonify({
             'success': True,
@@ -253,7 +340,7 @@ def get_voices():
 def regenerate_response():
     """Regenerate the last AI response with current settings."""
     try:
-        session_id = session_service.get_or_create_session_id(request)
+        session_id = g.session_id
         result = chat_service.regenerate_last_response(session_id)
         
         return jsonify(result), 200 if result['success'] else 400
@@ -268,7 +355,10 @@ def serve_audio(filename):
     """Serve generated audio files."""
     try:
         import tempfile
-        from flask import send_file
+        
+        audio_data = _get_cached_audio(filename)
+        if audio_data is not None:
+            return send_file(io.BytesIO(audio_data), mimetype='audio/mpeg', download_name=filename)
         
         file_path = os.path.join(tempfile.gettempdir(), filename)
         if os.path.exists(file_path):
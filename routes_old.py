@@ -96,15 +96,9 @@ def upload_file():
             
             # Use appropriate processor based on file type
             if file_extension == 'pdf':
-                # Use PDFProcessor for PDF files (proven stable)
-                try:
-                    pdf_info = pdf_processor.get_pdf_info(file_path)
-                    if pdf_info['page_count'] == 0:
-                        raise ValueError("PDF file contains no readable pages")
-                except Exception as e:
-                    raise ValueError(f"Invalid PDF file: {str(e)}")
-                
-                # Extract text chunks from PDF
+                # Use PDFProcessor for PDF files (proven stable).
+                # extract_text_chunks rejects PDFs without pages on its own handle,
+                # so the file is not opened a second time just to count them.
                 chunks = []
                 try:
                     chunk_generator = pdf_processor.extract_text_chunks(file_path)
@@ -118,10 +112,11 @@ def upload_file():
                 if not doc_processor.is_supported_format(file.filename):
                     raise ValueError("Unsupported file format")
                 
-                # Extract text chunks from document
+                # Open the document once for both its info and its text chunks
                 chunks = []
                 try:
-                    chunk_generator = doc_processor.extract_text_chunks(file_path)
+                    doc_info, chunk_generator = doc_processor.open_document(file_path)
+                    logger.info(f"Processing {doc_info['filename']} ({doc_info['pages']} pages)")
                     chunks = list(chunk_generator)
                 except Exception as e:
                     raise ValueError(f"Could not extract text from document: {str(e)}")
@@ -219,7 +214,7 @@ def chat():
                 session_id=session_id,
                 message_type='assistant',
                 content=response_text,
-                sources=json.dumps(sources) if sources else None
+                sources=sources or None
             )
             db.session.add(assistant_msg)
             db.session.commit()
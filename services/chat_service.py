@@ -5,13 +5,14 @@ Includes retry logic with exponential backoff and automatic fallback between AI
 """
 
 import os
-import json
 import time
 import random
-from typing import List, Dict, Tuple, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterator, Tuple, Optional
 from datetime import datetime
 
-from app import db
+from app import app, db
 from models import ChatMessage, Document, UserProfile
 from .base_service import BaseService
 from .document_service import DocumentService
@@ -49,6 +50,13 @@ if ai_provider is None:
 class ChatService(BaseService):
     """Clean service for handling chat operations."""
     
+    # Document changes within this window of each other trigger a single vector store update
+    VECTOR_STORE_DEBOUNCE_SECONDS = 0.2
+    
+    # Each batched message is a full AI call; cap the batch and how many run at once
+    MAX_BATCH_MESSAGES = 8
+    MAX_BATCH_WORKERS = 4
+    
     def __init__(self):
         super().__init__()
         self.document_service = DocumentService()
@@ -56,6 +64,12 @@ class ChatService(BaseService):
         self.simple_similarity = SimpleSimilarity()
         self.web_searcher = WebSearcher()
         
+        # Pending debounced vector store updates, one timer per session
+        self._pending_updates = {}
+        self._pending_lock = threading.Lock()
+        # Serializes vector store rebuilds between request threads and update timers
+        self._vector_store_lock = threading.RLock()
+        
         # Load existing vector store if available
         try:
             self.vector_store.load('vector_store.pkl')
@@ -84,8 +98,77 @@ class ChatService(BaseService):
         except Exception as e:
             return self.error_response(f"Chat processing failed: {str(e)}")
     
+    def process_chat_batch(self, queries: List[str], session_id: str) -> Dict:
+        """
+        Process several chat messages in one call.
+        The user profile is loaded once and the message count queried once for the whole batch.
+        Responses are generated concurrently; messages are saved in order afterwards.
+        """
+        try:
+            profile = UserProfile.query.filter_by(session_id=session_id).first()
+            ai_role = profile.ai_role if profile else "You are a helpful AI assistant."
+            
+            with ThreadPoolExecutor(max_workers=min(len(queries), self.MAX_BATCH_WORKERS)) as executor:
+                futures = [executor.submit(self._generate_response_in_context, query, session_id, ai_role)
+                           for query in queries]
+            
+            results = []
+            for query, future in zip(queries, futures):
+                try:
+                    response_text, sources = future.result()
+                    self._save_chat_messages(query, response_text, sources, session_id, ai_role)
+                    results.append({'success': True, 'response': response_text, 'sources': sources})
+                except Exception as e:
+                    self.logger.error(f"Batch chat message failed: {e}")
+                    results.append({'success': False, 'error': f"Chat processing failed: {str(e)}"})
+            
+            return self.success_response({
+                'results': results,
+                'message_count': self._get_message_count(session_id)
+            })
+            
+        except Exception as e:
+            return self.error_response(f"Batch chat processing failed: {str(e)}")
+    
+    def _generate_response_in_context(self, query: str, session_id: str, ai_role: str) -> Tuple[str, List[Dict]]:
+        """Run _generate_response on a worker thread, which needs its own application context."""
+        with app.app_context():
+            return self._generate_response(query, session_id, ai_role)
+    
+    def stream_chat_message(self, query: str, session_id: str) -> Iterator[Tuple[str, object]]:
+        """
+        Process a chat message as a stream of (event, data) pairs: ('sources', list) first,
+        then ('text', piece) while the answer is generated, then ('done', {...}) once the
+        messages are saved. A failure ends the stream with ('error', message).
+        """
+        try:
+            profile = UserProfile.query.filter_by(session_id=session_id).first()
+            ai_role = profile.ai_role if profile else "You are a helpful AI assistant."
+            
+            context, sources = self._build_context(query, session_id)
+            yield 'sources', sources
+            
+            pieces = []
+            for piece in self._stream_ai_response(query, context, ai_role):
+                pieces.append(piece)
+                yield 'text', piece
+            
+            self._save_chat_messages(query, ''.join(pieces), sources, session_id, ai_role)
+            yield 'done', {'message_count': self._get_message_count(session_id)}
+            
+        except Exception as e:
+            self.logger.error(f"Streaming chat failed: {e}")
+            yield 'error', f"Chat processing failed: {str(e)}"
+    
     def _generate_response(self, query: str, session_id: str, ai_role: str) -> Tuple[str, List[Dict]]:
         """Generate AI response combining document content and web search."""
+        full_context, sources = self._build_context(query, session_id)
+        response = self._generate_ai_response(query, full_context, ai_role)
+        
+        return response, sources
+    
+    def _build_context(self, query: str, session_id: str) -> Tuple[str, List[Dict]]:
+        """Gather document and web context for a query, with the sources it came from."""
         sources = []
         context_parts = []
         
@@ -101,11 +184,8 @@ class ChatService(BaseService):
             context_parts.append(f"Additional Information:\n{web_context}")
             sources.extend(web_sources)
         
-        # 3. Generate AI response
         full_context = "\n\n".join(context_parts) if context_parts else ""
-        response = self._generate_ai_response(query, full_context, ai_role)
-        
-        return response, sources
+        return full_context, sources
     
     def _search_documents(self, query: str, session_id: str) -> Tuple[str, List[Dict]]:
         """Search in uploaded documents."""
@@ -115,12 +195,14 @@ class ChatService(BaseService):
             if not active_docs:
                 return "", []
             
-            # Rebuild vector store with only session documents to ensure isolation
-            self._rebuild_vector_store_for_session(session_id)
-            
             # Try vector search first
             try:
-                results = self.vector_store.search(query, k=5)
+                # Rebuild vector store with only session documents to ensure isolation; the lock
+                # is held through the search so a scheduled update cannot change the index in between
+                with self._vector_store_lock:
+                    self._rebuild_vector_store_for_session(session_id)
+                    results = self.vector_store.search(query, k=5)
+                
                 if results:
                     # Since we rebuilt the vector store with only session docs, all results are valid
                     # Combine relevant chunks (lowered threshold for FAISS cosine similarity)
@@ -278,6 +360,45 @@ class ChatService(BaseService):
         
         return "I'm having trouble connecting to AI services right now. Please try again in a few moments."
     
+    def _stream_ai_response(self, query: str, context: str, ai_role: str) -> Iterator[str]:
+        """
+        Yield the response in pieces as the primary provider generates it.
+        If streaming fails before anything was sent, fall back to _generate_ai_response
+        (retries plus the other provider) and yield its whole answer.
+        """
+        yielded = False
+        try:
+            if ai_provider == "gemini" and gemini_client:
+                stream = gemini_client.models.generate_content_stream(
+                    model="gemini-2.5-flash",
+                    contents=self._gemini_prompt(query, context, ai_role)
+                )
+                pieces = (chunk.text for chunk in stream)
+            elif ai_provider == "openai" and openai_client:
+                stream = openai_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=self._openai_messages(query, context, ai_role),
+                    max_tokens=1000,
+                    temperature=0.7,
+                    stream=True
+                )
+                pieces = (chunk.choices[0].delta.content for chunk in stream if chunk.choices)
+            else:
+                pieces = iter(())
+            
+            for piece in pieces:
+                if piece:
+                    yielded = True
+                    yield piece
+        except Exception as e:
+            # Part of the answer has already been sent; it cannot be replaced by another provider's
+            if yielded:
+                raise
+            self.logger.warning(f"Streaming {ai_provider} response failed, falling back: {e}")
+        
+        if not yielded:
+            yield self._generate_ai_response(query, context, ai_role)
+    
     def _is_retryable_error(self, error) -> bool:
         """Check if an error is retryable (503, rate limit, overloaded, etc.)."""
         error_str = str(error).lower()
@@ -325,28 +446,16 @@ class ChatService(BaseService):
         self.logger.error(f"{provider_name} failed after {max_retries} retries. Last error: {last_error}")
         return None
     
-    def _generate_gemini_response(self, query: str, context: str, ai_role: str) -> str:
-        """Generate response using Google Gemini."""
-        # Prepare prompt
+    def _gemini_prompt(self, query: str, context: str, ai_role: str) -> str:
+        """Build the single-string Gemini prompt."""
         system_prompt = ai_role + "\n\nUse the provided context to answer questions accurately. If the context doesn't contain relevant information, provide a helpful general response."
         
         if context:
-            prompt = f"{system_prompt}\n\nContext:\n{context}\n\nQuestion: {query}"
-        else:
-            prompt = f"{system_prompt}\n\nQuestion: {query}"
-        
-        # Call Gemini API - let exceptions propagate for retry logic
-        response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
-        
-        response_text = response.text
-        return response_text if response_text else "I apologize, but I couldn't generate a proper response."
+            return f"{system_prompt}\n\nContext:\n{context}\n\nQuestion: {query}"
+        return f"{system_prompt}\n\nQuestion: {query}"
     
-    def _generate_openai_response(self, query: str, context: str, ai_role: str) -> str:
-        """Generate response using OpenAI."""
-        # Prepare prompt
+    def _openai_messages(self, query: str, context: str, ai_role: str) -> List[Dict]:
+        """Build the OpenAI chat messages."""
         system_prompt = ai_role + "\n\nUse the provided context to answer questions accurately. If the context doesn't contain relevant information, provide a helpful general response."
         
         messages = [
@@ -363,11 +472,25 @@ class ChatService(BaseService):
                 "role": "user", 
                 "content": query
             })
+        return messages
+    
+    def _generate_gemini_response(self, query: str, context: str, ai_role: str) -> str:
+        """Generate response using Google Gemini."""
+        # Call Gemini API - let exceptions propagate for retry logic
+        response = gemini_client.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=self._gemini_prompt(query, context, ai_role)
+        )
         
+        response_text = response.text
+        return response_text if response_text else "I apologize, but I couldn't generate a proper response."
+    
+    def _generate_openai_response(self, query: str, context: str, ai_role: str) -> str:
+        """Generate response using OpenAI."""
         # Call OpenAI API - let exceptions propagate for retry logic
         response = openai_client.chat.completions.create(
             model="gpt-4o",  # Latest model
-            messages=messages,
+            messages=self._openai_messages(query, context, ai_role),
             max_tokens=1000,
             temperature=0.7
         )
@@ -390,7 +513,7 @@ class ChatService(BaseService):
                 session_id=session_id,
                 message_type='assistant',
                 content=ai_response,
-                sources=json.dumps(sources) if sources else None,
+                sources=sources or None,
                 ai_role_used=ai_role
             )
             
@@ -405,19 +528,46 @@ class ChatService(BaseService):
         """Get total message count for session."""
         return ChatMessage.query.filter_by(session_id=session_id).count()
     
+    def schedule_vector_store_update(self, session_id: str):
+        """
+        Update the vector store for a session in the background, once per burst of changes.
+        Each call restarts the session's debounce timer, so uploading or toggling several
+        documents in a row costs one update instead of one per request.
+        """
+        with self._pending_lock:
+            pending = self._pending_updates.get(session_id)
+            if pending:
+                pending.cancel()
+            
+            timer = threading.Timer(self.VECTOR_STORE_DEBOUNCE_SECONDS, self._run_scheduled_update, args=(session_id,))
+            timer.daemon = True
+            self._pending_updates[session_id] = timer
+            timer.start()
+    
+    def _run_scheduled_update(self, session_id: str):
+        """Timer callback: run a debounced update inside an application context."""
+        with self._pending_lock:
+            # A newer timer may already have replaced this one; leave it in place
+            if self._pending_updates.get(session_id) is threading.current_thread():
+                del self._pending_updates[session_id]
+        
+        with app.app_context():
+            self.update_vector_store(session_id)
+    
     def update_vector_store(self, session_id: str):
         """Update vector store with documents from this session."""
         try:
             active_docs = Document.query.filter_by(session_id=session_id, is_active=True).all()
             
-            for doc in active_docs:
-                if os.path.exists(doc.file_path):
-                    chunks = list(self.document_service.extract_text_chunks(doc.file_path))
-                    if chunks:
-                        self.vector_store.add_texts(chunks, doc.id)
-            
-            # Save updated vector store
-            self.vector_store.save('vector_store.pkl')
+            with self._vector_store_lock:
+                for doc in active_docs:
+                    if os.path.exists(doc.file_path):
+                        chunks = list(self.document_service.extract_text_chunks(doc.file_path))
+                        if chunks:
+                            self.vector_store.add_texts(chunks, doc.id)
+                
+                # Save updated vector store
+                self.vector_store.save('vector_store.pkl')
             
         except Exception as e:
             if "insufficient_quota" in str(e) or "429" in str(e):
@@ -472,24 +622,25 @@ class ChatService(BaseService):
     def _rebuild_vector_store_for_session(self, session_id: str):
         """Rebuild vector store with only documents from current session."""
         try:
-            # Clear existing vector store
-            self.vector_store.clear()
-            
-            # Get active documents for this session only
-            active_docs = Document.query.filter_by(session_id=session_id, is_active=True).all()
-            
-            if not active_docs:
-                return
-            
-            # Add documents to vector store
-            for doc in active_docs:
-                if os.path.exists(doc.file_path):
-                    try:
-                        chunks = list(self.document_service.extract_text_chunks(doc.file_path))
-                        if chunks:
-                            self.vector_store.add_texts(chunks, doc.id)
-                    except Exception as e:
-                        self.logger.warning(f"Failed to add document {doc.filename} to vector store: {e}")
+            with self._vector_store_lock:
+                # Clear existing vector store
+                self.vector_store.clear()
+                
+                # Get active documents for this session only
+                active_docs = Document.query.filter_by(session_id=session_id, is_active=True).all()
+                
+                if not active_docs:
+                    return
+                
+                # Add documents to vector store
+                for doc in active_docs:
+                    if os.path.exists(doc.file_path):
+                        try:
+                            chunks = list(self.document_service.extract_text_chunks(doc.file_path))
+                            if chunks:
+                                self.vector_store.add_texts(chunks, doc.id)
+                        except Exception as e:
+                            self.logger.warning(f"Failed to add document {doc.filename} to vector store: {e}")
                         
         except Exception as e:
             self.logger.error(f"Failed to rebuild vector store for session: {e}")
\ No newline at end of file
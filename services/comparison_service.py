@@ -102,14 +102,14 @@ class ComparisonService(BaseService):
         """Find unique words in each document."""
         unique_content = {}
         
+        # Count how many documents each word appears in (one pass instead of a union per document)
+        doc_frequency = Counter()
+        for word_set in doc_word_sets.values():
+            doc_frequency.update(word_set)
+        
         for doc_name, word_set in doc_word_sets.items():
             # Find words unique to this document
-            other_words = set()
-            for other_doc, other_words_set in doc_word_sets.items():
-                if other_doc != doc_name:
-                    other_words.update(other_words_set)
-            
-            unique_words = word_set - other_words
+            unique_words = [word for word in word_set if doc_frequency[word] == 1]
             
             # Return top 15 unique words, sorted
             unique_content[doc_name] = sorted(unique_words)[:15]
@@ -4,9 +4,12 @@ Handles all document-related operations including upload, processing, and manage
 """
 
 import os
+import re
 import logging
 import tempfile
-from typing import List, Dict, Generator, Optional, Tuple
+from typing import List, Dict, Generator, Iterator, Optional, Tuple
+from collections import deque
+from functools import lru_cache
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
@@ -24,12 +27,58 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Chemical equation conversions
+_SPECIAL_CHARS_TABLE = str.maketrans({
+    # Superscripts (common in chemistry)
+    '⁰': '0', '¹': '1', '²': '2', '³': '3', '⁴': '4', '⁵': '5',
+    '⁶': '6', '⁷': '7', '⁸': '8', '⁹': '9', '⁺': '+', '⁻': '-',
+    
+    # Subscripts (common in chemical formulas)
+    '₀': '0', '₁': '1', '₂': '2', '₃': '3', '₄': '4', '₅': '5',
+    '₆': '6', '₇': '7', '₈': '8', '₉': '9', '₊': '+', '₋': '-',
+    
+    # Greek letters (common in equations)
+    'α': 'alpha', 'β': 'beta', 'γ': 'gamma', 'δ': 'delta',
+    'ε': 'epsilon', 'θ': 'theta', 'λ': 'lambda', 'μ': 'mu',
+    'π': 'pi', 'ρ': 'rho', 'σ': 'sigma', 'φ': 'phi', 'ω': 'omega',
+    
+    # Mathematical symbols
+    '×': 'x', '÷': '/', '≈': '~', '≡': '=', '≠': '!=',
+    '≤': '<=', '≥': '>=', '∞': 'infinity',
+})
+
+# Same conversions, plus deleting control characters that are not whitespace;
+# the whitespace ones are collapsed with the rest of the whitespace
+_CLEAN_TEXT_TABLE = {
+    **_SPECIAL_CHARS_TABLE,
+    **{code: None for code in [*range(0x00, 0x20), 0x7F] if not chr(code).isspace()},
+}
+
+# Paragraphs and lines shorter than this are memoized: headers, footers and
+# boilerplate lines repeat throughout a document
+_CLEAN_TEXT_MEMO_LENGTH = 512
+
+def _normalize_text(text: str) -> str:
+    """Convert special characters, drop control characters and collapse whitespace."""
+    # Convert Unicode special characters and drop control characters in one pass
+    text = text.translate(_CLEAN_TEXT_TABLE)
+    
+    # Remove excessive whitespace but preserve structure
+    text = _WHITESPACE_RE.sub(' ', text)
+    
+    return text.strip()
+
+_normalize_short_text = lru_cache(maxsize=4096)(_normalize_text)
+
 class DocumentService(BaseService):
     """Unified service for all document operations."""
     
     ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt', 'md'}
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
     CHUNK_SIZE = 1000  # Words per chunk
+    DOCUMENT_BATCH_SIZE = 64  # Document rows loaded and encoded per batch when listing
     
     def __init__(self):
         super().__init__()
@@ -111,14 +160,17 @@ class DocumentService(BaseService):
     
     def extract_text_chunks(self, file_path: str) -> Generator[str, None, None]:
         """Extract text from any supported document format in chunks."""
-        if not os.path.exists(file_path):
+        # Single stat() call: covers the existence check and the file size
+        try:
+            file_size = os.stat(file_path).st_size
+        except FileNotFoundError:
             raise FileNotFoundError(f"File not found: {file_path}")
         
         file_ext = file_path.lower().split('.')[-1]
         
         try:
             if file_ext == 'pdf':
-                yield from self._extract_pdf_chunks(file_path)
+                yield from self._extract_pdf_chunks(file_path, file_size)
             elif file_ext == 'docx':
                 yield from self._extract_docx_chunks(file_path)
             elif file_ext in ['txt', 'md']:
@@ -129,16 +181,16 @@ class DocumentService(BaseService):
             logger.error(f"Text extraction failed for {file_path}: {e}")
             raise
     
-    def _extract_pdf_chunks(self, pdf_path: str) -> Generator[str, None, None]:
+    def _extract_pdf_chunks(self, pdf_path: str, file_size: Optional[int] = None) -> Generator[str, None, None]:
         """Extract text from PDF with optimized processing for large files."""
-        file_size = os.path.getsize(pdf_path)
+        if file_size is None:
+            file_size = os.stat(pdf_path).st_size
         logger.info(f"Processing PDF: {os.path.basename(pdf_path)} ({file_size} bytes)")
         
         # Process with optimized settings for large files
         try:
             with pdfplumber.open(pdf_path) as pdf:
-                current_chunk = ""
-                word_count = 0
+                words = deque()
                 total_pages = len(pdf.pages)
                 logger.info(f"Processing {total_pages} pages from PDF")
                 
@@ -149,23 +201,17 @@ class DocumentService(BaseService):
                             logger.info(f"Processing page {page_num + 1}/{total_pages}")
                         
                         text = page.extract_text() or ""
-                        cleaned_text = self._clean_text(text)
-                        
-                        words = cleaned_text.split()
-                        for word in words:
-                            current_chunk += " " + word
-                            word_count += 1
-                            
-                            if word_count >= self.CHUNK_SIZE:
-                                yield current_chunk.strip()
-                                current_chunk = ""
-                                word_count = 0
+                        words.extend(self._clean_text(text).split())
+                        yield from self._drain_full_chunks(words)
                     except Exception as e:
                         logger.warning(f"Error processing page {page_num} in {pdf_path}: {e}")
                         continue
+                    finally:
+                        # Drop the page's cached layout objects; pdf.pages keeps every page alive otherwise
+                        page.close()
                 
-                if current_chunk.strip():
-                    yield current_chunk.strip()
+                if words:
+                    yield " ".join(words)
                 return
                     
         except Exception as e:
@@ -176,26 +222,16 @@ class DocumentService(BaseService):
         """Extract text from DOCX files."""
         try:
             doc = DocxDocument(docx_path)
-            current_chunk = ""
-            word_count = 0
+            words = deque()
             
             for paragraph in doc.paragraphs:
                 text = paragraph.text
                 if text.strip():
-                    cleaned_text = self._clean_text(text)
-                    words = cleaned_text.split()
-                    
-                    for word in words:
-                        current_chunk += " " + word
-                        word_count += 1
-                        
-                        if word_count >= self.CHUNK_SIZE:
-                            yield current_chunk.strip()
-                            current_chunk = ""
-                            word_count = 0
+                    words.extend(self._clean_text(text).split())
+                    yield from self._drain_full_chunks(words)
             
-            if current_chunk.strip():
-                yield current_chunk.strip()
+            if words:
+                yield " ".join(words)
                 
         except Exception as e:
             logger.error(f"DOCX extraction failed for {docx_path}: {e}")
@@ -205,86 +241,54 @@ class DocumentService(BaseService):
         """Extract text from plain text and markdown files."""
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
-                current_chunk = ""
-                word_count = 0
+                words = deque()
                 
                 for line in file:
-                    cleaned_line = self._clean_text(line)
-                    words = cleaned_line.split()
-                    
-                    for word in words:
-                        current_chunk += " " + word
-                        word_count += 1
-                        
-                        if word_count >= self.CHUNK_SIZE:
-                            yield current_chunk.strip()
-                            current_chunk = ""
-                            word_count = 0
+                    words.extend(self._clean_text(line).split())
+                    yield from self._drain_full_chunks(words)
                 
-                if current_chunk.strip():
-                    yield current_chunk.strip()
+                if words:
+                    yield " ".join(words)
                     
         except UnicodeDecodeError:
             # Try with different encoding
             try:
                 with open(file_path, 'r', encoding='latin-1') as file:
-                    content = file.read()
-                    cleaned_content = self._clean_text(content)
-                    words = cleaned_content.split()
+                    words = deque()
                     
-                    for i in range(0, len(words), self.CHUNK_SIZE):
-                        chunk = " ".join(words[i:i + self.CHUNK_SIZE])
-                        yield chunk
+                    for line in file:
+                        words.extend(self._clean_text(line).split())
+                        yield from self._drain_full_chunks(words)
+                    
+                    if words:
+                        yield " ".join(words)
             except Exception as e:
                 logger.error(f"Text file extraction failed: {e}")
                 raise ValueError(f"Failed to process text file: {str(e)}")
     
+    def _drain_full_chunks(self, words: deque) -> Generator[str, None, None]:
+        """Pop CHUNK_SIZE words at a time off the front of the buffer while a full chunk is buffered."""
+        while len(words) >= self.CHUNK_SIZE:
+            yield " ".join([words.popleft() for _ in range(self.CHUNK_SIZE)])
+    
     def _clean_text(self, text: str) -> str:
         """Clean extracted text while preserving important formatting."""
-        import re
-        
-        # Convert Unicode special characters
-        text = self._convert_special_characters(text)
-        
-        # Remove excessive whitespace but preserve structure
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove control characters but keep printable text
-        text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', text)
-        
-        return text.strip()
+        if len(text) < _CLEAN_TEXT_MEMO_LENGTH:
+            return _normalize_short_text(text)
+        return _normalize_text(text)
     
     def _convert_special_characters(self, text: str) -> str:
         """Convert Unicode special characters to readable format."""
-        # Chemical equation conversions
-        conversions = {
-            # Superscripts (common in chemistry)
-            '⁰': '0', '¹': '1', '²': '2', '³': '3', '⁴': '4', '⁵': '5',
-            '⁶': '6', '⁷': '7', '⁸': '8', '⁹': '9', '⁺': '+', '⁻': '-',
-            
-            # Subscripts (common in chemical formulas)
-            '₀': '0', '₁': '1', '₂': '2', '₃': '3', '₄': '4', '₅': '5',
-            '₆': '6', '₇': '7', '₈': '8', '₉': '9', '₊': '+', '₋': '-',
-            
-            # Greek letters (common in equations)
-            'α': 'alpha', 'β': 'beta', 'γ': 'gamma', 'δ': 'delta',
-            'ε': 'epsilon', 'θ': 'theta', 'λ': 'lambda', 'μ': 'mu',
-            'π': 'pi', 'ρ': 'rho', 'σ': 'sigma', 'φ': 'phi', 'ω': 'omega',
-            
-            # Mathematical symbols
-            '×': 'x', '÷': '/', '≈': '~', '≡': '=', '≠': '!=',
-            '≤': '<=', '≥': '>=', '∞': 'infinity',
-        }
-        
-        for unicode_char, replacement in conversions.items():
-            text = text.replace(unicode_char, replacement)
-        
-        return text
+        return text.translate(_SPECIAL_CHARS_TABLE)
     
     def get_session_documents(self, session_id: str) -> List[Document]:
         """Get all documents for a session."""
         return Document.query.filter_by(session_id=session_id).all()
     
+    def iter_session_documents(self, session_id: str, batch_size: int = DOCUMENT_BATCH_SIZE) -> Iterator[Document]:
+        """Iterate a session's documents, loading them from the database batch_size rows at a time."""
+        return iter(Document.query.filter_by(session_id=session_id).yield_per(batch_size))
+    
     def get_active_documents(self, session_id: str) -> List[Document]:
         """Get all active documents for a session."""
         return Document.query.filter_by(session_id=session_id, is_active=True).all()
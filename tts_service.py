@@ -7,6 +7,65 @@ from openai import OpenAI
 logger = logging.getLogger(__name__)
 
 class TTSService:
+    # Valid OpenAI voice names, shared by all instances for O(1) membership checks
+    AVAILABLE_VOICES = frozenset({
+        "alloy",    # Neutral, balanced
+        "echo",     # Male, clear
+        "fable",    # British accent
+        "onyx",     # Deep male
+        "nova",     # Female, warm
+        "shimmer"   # Female, bright
+    })
+    
+    # Per-language word replacements, built once instead of on every request
+    WORD_REPLACEMENTS = {
+        # Telugu-English mixed replacements
+        "tenglish": {
+            "good": "baagundu",
+            "yes": "avunu", 
+            "no": "ledu",
+            "understand": "ardham ayindi",
+            "learn": "nerchukondi",
+            "study": "chaduvukondi",
+            "great": "chala baagundu",
+            "nice": "manchidi",
+            "API": "A-P-I api",
+            "PDF": "P-D-F file",
+            "database": "data-base lo",
+            "function": "function chesthe"
+        },
+        # Indian English specific replacements
+        "indian_english": {
+            "utilize": "use",
+            "demonstrate": "show", 
+            "subsequently": "then",
+            "furthermore": "also",
+            "therefore": "so",
+            "however": "but",
+            "awesome": "fantastic",
+            "cool": "nice",
+            "API": "A-P-I",
+            "PDF": "P-D-F document",
+            "algorithm": "algo-rhythm",
+            "schedule": "shed-yule"
+        },
+        # Standard English replacements
+        "english": {
+            "utilize": "use",
+            "demonstrate": "show",
+            "subsequently": "then", 
+            "furthermore": "also",
+            "therefore": "so",
+            "however": "but",
+            "nevertheless": "still",
+            "approximately": "about",
+            "API": "A-P-I",
+            "PDF": "P-D-F",
+            "URL": "U-R-L",
+            "SQL": "S-Q-L"
+        }
+    }
+    
     def __init__(self):
         """Initialize TTS service with OpenAI."""
         self.openai_api_key = os.environ.get("OPENAI_API_KEY")
@@ -15,15 +74,6 @@ class TTSService:
         
         # Initialize OpenAI client
         self.client = OpenAI(api_key=self.openai_api_key)
-        
-        self.available_voices = [
-            "alloy",    # Neutral, balanced
-            "echo",     # Male, clear
-            "fable",    # British accent
-            "onyx",     # Deep male
-            "nova",     # Female, warm
-            "shimmer"   # Female, bright
-        ]
     
     def text_to_speech(self, text: str, voice: str = "alloy") -> bytes:
         """
@@ -31,7 +81,7 @@ class TTSService:
         Returns audio data as bytes.
         """
         try:
-            if voice not in self.available_voices:
+            if voice not in self.AVAILABLE_VOICES:
                 logger.warning(f"Voice '{voice}' not available, using 'alloy'")
                 voice = "alloy"
             
@@ -149,62 +199,15 @@ class TTSService:
         processed_text = text.replace("**", "").replace("*", "")
         
         # Language-specific processing
-        if language == "tenglish":
-            # Telugu-English mixed replacements
-            word_replacements = {
-                "good": "baagundu",
-                "yes": "avunu", 
-                "no": "ledu",
-                "understand": "ardham ayindi",
-                "learn": "nerchukondi",
-                "study": "chaduvukondi",
-                "great": "chala baagundu",
-                "nice": "manchidi",
-                "API": "A-P-I api",
-                "PDF": "P-D-F file",
-                "database": "data-base lo",
-                "function": "function chesthe"
-            }
-            # Add Telugu-style encouraging phrases
-            if emotion == "enthusiastic":
+        word_replacements = self.WORD_REPLACEMENTS.get(language, self.WORD_REPLACEMENTS['english'])
+        
+        if emotion == "enthusiastic":
+            if language == "tenglish":
+                # Add Telugu-style encouraging phrases
                 processed_text = f"Waah! {processed_text} Chala baagundu!"
-                
-        elif language == "indian_english":
-            # Indian English specific replacements
-            word_replacements = {
-                "utilize": "use",
-                "demonstrate": "show", 
-                "subsequently": "then",
-                "furthermore": "also",
-                "therefore": "so",
-                "however": "but",
-                "awesome": "fantastic",
-                "cool": "nice",
-                "API": "A-P-I",
-                "PDF": "P-D-F document",
-                "algorithm": "algo-rhythm",
-                "schedule": "shed-yule"
-            }
-            if emotion == "enthusiastic":
+            elif language == "indian_english":
                 processed_text = f"Very good! {processed_text} Keep it up!"
-                
-        else:
-            # Standard English replacements
-            word_replacements = {
-                "utilize": "use",
-                "demonstrate": "show",
-                "subsequently": "then", 
-                "furthermore": "also",
-                "therefore": "so",
-                "however": "but",
-                "nevertheless": "still",
-                "approximately": "about",
-                "API": "A-P-I",
-                "PDF": "P-D-F",
-                "URL": "U-R-L",
-                "SQL": "S-Q-L"
-            }
-            if emotion == "enthusiastic":
+            else:
                 processed_text = "Great question! " + processed_text
         
         # Apply word replacements
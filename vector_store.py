@@ -1,6 +1,6 @@
 import faiss
 import numpy as np
-from typing import List, Tuple
+from typing import Iterable, List, Optional, Tuple
 import pickle
 import os
 import logging
@@ -58,19 +58,35 @@ class VectorStore:
             logger.error(f"Error adding texts to vector store: {e}")
             raise
     
-    def search(self, query: str, k: int = 5) -> List[Tuple[str, float, int]]:
-        """Search for similar text chunks."""
+    def search(self, query: str, k: int = 5,
+               allowed_doc_ids: Optional[Iterable[int]] = None) -> List[Tuple[str, float, int]]:
+        """
+        Search for similar text chunks.
+        If allowed_doc_ids is given, only chunks from those documents are considered.
+        """
         try:
             if self.index.ntotal == 0:
                 return []
             
+            # Restrict the search to chunks of the allowed documents inside FAISS
+            search_params = None
+            if allowed_doc_ids is not None:
+                allowed = set(allowed_doc_ids)
+                positions = np.fromiter(
+                    (i for i, doc_id in enumerate(self.document_ids) if doc_id in allowed),
+                    dtype='int64'
+                )
+                if positions.size == 0:
+                    return []
+                search_params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(positions))
+            
             # Get query embedding
             query_embedding = self._get_embeddings([query])[0]
             query_embedding = query_embedding / np.linalg.norm(query_embedding)
             
             # Search
             scores, indices = self.index.search(
-                query_embedding.reshape(1, -1).astype('float32'), k
+                query_embedding.reshape(1, -1).astype('float32'), k, params=search_params
             )
             
             results = []